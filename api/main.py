@@ -1,14 +1,17 @@
 import boto3
 import os
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
+from typing import Optional
 import numpy as np
 import sqlalchemy
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
 
+from model_pool import ModelPool, ModelNotFoundError
+
 # --- Database Setup ---
 DB_ENDPOINT = os.environ.get("DB_ENDPOINT")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
@@ -32,9 +35,36 @@ class PredictionLog(Base):
     viscera_weight = Column(Float)
     shell_weight = Column(Float)
     predicted_age = Column(Float)
+    model_version = Column(String)
+
+# Model-ready feature columns, in the order the model expects them. This must match
+# FEATURE_COLUMNS in src/materialize_features.py, which builds the offline table.
+FEATURE_COLUMNS = [
+    "length", "diameter", "height", "whole_weight", "shucked_weight",
+    "viscera_weight", "shell_weight", "sex_f", "sex_i", "sex_m",
+]
+
+# Online feature store: the encoded row for each logged prediction, written at ingest
+# time so retraining never has to re-run the transform on raw logs.
+class PredictionFeatures(Base):
+    __tablename__ = "prediction_features"
+    id = Column(Integer, ForeignKey("prediction_logs.id"), primary_key=True)
+    length = Column(Float)
+    diameter = Column(Float)
+    height = Column(Float)
+    whole_weight = Column(Float)
+    shucked_weight = Column(Float)
+    viscera_weight = Column(Float)
+    shell_weight = Column(Float)
+    sex_f = Column(Float)
+    sex_i = Column(Float)
+    sex_m = Column(Float)
 
 # Create the table if it doesn't exist
 Base.metadata.create_all(bind=engine)
+# Tables created before multi-model serving lack the model_version column.
+with engine.begin() as conn:
+    conn.execute(sqlalchemy.text("ALTER TABLE prediction_logs ADD COLUMN IF NOT EXISTS model_version VARCHAR"))
 # --- End Database Setup ---
 
 app = FastAPI()
@@ -43,8 +73,14 @@ app = FastAPI()
 SAGEMAKER_ENDPOINT_NAME = os.environ.get("SAGEMAKER_ENDPOINT_NAME", "abalone-production")
 AWS_REGION = os.environ.get("AWS_REGION", "<<AWS_REGION>>")
 
-# Initialize boto3 client
-sagemaker_runtime = boto3.client("sagemaker-runtime", region_name=AWS_REGION)
+# Version-aware model pool. The default route points at SAGEMAKER_ENDPOINT_NAME, so a
+# deployment without MODEL_ROUTES behaves exactly like a single-endpoint API.
+model_pool = ModelPool.from_env(SAGEMAKER_ENDPOINT_NAME, AWS_REGION)
+
+@app.on_event("startup")
+def preload_models():
+    hot_versions = [v for v in os.environ.get("MODEL_PRELOAD", model_pool.default_version).split(",") if v]
+    model_pool.preload(hot_versions)
 
 class AbaloneFeatures(BaseModel):
     # The model was trained on one-hot encoded 'Sex' feature.
@@ -58,25 +94,16 @@ class AbaloneFeatures(BaseModel):
     viscera_weight: float
     shell_weight: float
 
-@app.get("/")
-def read_root():
-    return {"message": "Abalone age prediction API"}
+# One-hot encoding of 'Sex'. This must match the encoding used during training in preprocess.py;
+# the order of one-hot features follows `ohe.categories_`, i.e. ['F', 'I', 'M'].
+SEX_ENCODING = {'F': [1.0, 0.0, 0.0], 'I': [0.0, 1.0, 0.0], 'M': [0.0, 0.0, 1.0]}
 
-@app.post("/predict")
-async def predict(features: AbaloneFeatures):
-    # One-hot encode the 'Sex' feature
-    # This must match the encoding used during training in preprocess.py
-    sex_map = {'F': [1.0, 0.0, 0.0], 'I': [0.0, 1.0, 0.0], 'M': [0.0, 0.0, 1.0]}
-    sex_encoded = sex_map.get(features.sex.upper())
-    
+def encode_features(features):
+    """Returns the model-ready vector in FEATURE_COLUMNS order, or None for an invalid 'sex'."""
+    sex_encoded = SEX_ENCODING.get(features.sex.upper())
     if sex_encoded is None:
-        return {"error": "Invalid value for 'sex'. Must be 'M', 'F', or 'I'."}, 400
-
-    # The order must match the training data columns (after 'Rings' which is the target)
-    # Original columns: Length, Diameter, Height, Whole weight, Shucked weight, Viscera weight, Shell weight
-    # One-hot columns (from sklearn): Sex_F, Sex_I, Sex_M
-    # The order of one-hot features depends on `ohe.categories_`. Assuming ['F', 'I', 'M'].
-    feature_vector = [
+        return None
+    return [
         features.length,
         features.diameter,
         features.height,
@@ -85,20 +112,34 @@ async def predict(features: AbaloneFeatures):
         features.viscera_weight,
         features.shell_weight,
     ] + sex_encoded
-    
-    # Convert to CSV string for the SageMaker endpoint
-    payload = ",".join(map(str, feature_vector))
-    
+
+@app.get("/")
+def read_root():
+    return {"message": "Abalone age prediction API"}
+
+@app.get("/models")
+def list_models():
+    return model_pool.describe()
+
+# A plain `def` so FastAPI runs it in its threadpool: model loads (including registry
+# downloads) and SageMaker calls block, and must not stall the event loop.
+@app.post("/predict")
+def predict(features: AbaloneFeatures, version: Optional[str] = None):
+    feature_vector = encode_features(features)
+    if feature_vector is None:
+        return {"error": "Invalid value for 'sex'. Must be 'M', 'F', or 'I'."}, 400
+
+    # `version` may be a registry version ("3") or an alias ("production", "challenger").
+    # When omitted, the pool picks the default or draws from MODEL_TRAFFIC_SPLIT.
     try:
-        response = sagemaker_runtime.invoke_endpoint(
-            EndpointName=SAGEMAKER_ENDPOINT_NAME,
-            ContentType="text/csv",
-            Body=payload
-        )
-        
-        result = response['Body'].read().decode()
+        model_version = model_pool.resolve(version)
+    except ModelNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version '{version}'.")
+
+    try:
+        handle = model_pool.get(model_version)
         # The result is a single value, the predicted number of rings (age)
-        predicted_age = float(result)
+        predicted_age = handle.predict(feature_vector)
         
         # Log prediction to the database
         db = SessionLocal()
@@ -111,13 +152,16 @@ async def predict(features: AbaloneFeatures):
             shucked_weight=features.shucked_weight,
             viscera_weight=features.viscera_weight,
             shell_weight=features.shell_weight,
-            predicted_age=predicted_age
+            predicted_age=predicted_age,
+            model_version=model_version
         )
         db.add(log_entry)
+        db.flush()
+        db.add(PredictionFeatures(id=log_entry.id, **dict(zip(FEATURE_COLUMNS, feature_vector))))
         db.commit()
         db.close()
         
-        return {"predicted_age": round(predicted_age, 2)}
+        return {"predicted_age": round(predicted_age, 2), "model_version": model_version}
 
     except Exception as e:
         # Consider more specific error handling in production
@@ -0,0 +1,243 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import boto3
+
+# Registered model name used by src/train.py when logging to the MLflow registry.
+REGISTERED_MODEL_NAME = os.environ.get("REGISTERED_MODEL_NAME", "abalone-xgboost-model")
+
+# Rough footprint of an endpoint handle. The model itself lives in SageMaker, so
+# only the client and bookkeeping count against the pool's memory budget.
+ENDPOINT_HANDLE_BYTES = 64 * 1024
+
+
+class ModelNotFoundError(KeyError):
+    """Raised when a request names a version or alias that has no route."""
+
+
+class EndpointHandle:
+    """Serves predictions from a SageMaker endpoint, optionally pinned to one variant."""
+
+    def __init__(self, version, endpoint_name, variant=None, region=None):
+        self.version = version
+        self.endpoint_name = endpoint_name
+        self.variant = variant
+        self.client = boto3.client("sagemaker-runtime", region_name=region)
+        self.memory_bytes = ENDPOINT_HANDLE_BYTES
+
+    def predict(self, feature_vector):
+        kwargs = {
+            "EndpointName": self.endpoint_name,
+            "ContentType": "text/csv",
+            "Body": ",".join(map(str, feature_vector)),
+        }
+        if self.variant:
+            kwargs["TargetVariant"] = self.variant
+        response = self.client.invoke_endpoint(**kwargs)
+        return float(response['Body'].read().decode())
+
+
+class BoosterHandle:
+    """Serves predictions from an XGBoost booster loaded out of the MLflow registry."""
+
+    def __init__(self, version, model_ref):
+        # Imported lazily so endpoint-only deployments don't pay for mlflow/xgboost.
+        import mlflow.xgboost
+        import xgboost as xgb
+
+        self._xgb = xgb
+        self.version = version
+        self.model_uri = f"models:/{REGISTERED_MODEL_NAME}/{model_ref}"
+        self.booster = mlflow.xgboost.load_model(self.model_uri)
+        self.memory_bytes = len(self.booster.save_raw())
+
+    def predict(self, feature_vector):
+        # train.py fits on a DataFrame, so the booster expects its column names ("1".."10").
+        dmatrix = self._xgb.DMatrix([feature_vector], feature_names=self.booster.feature_names)
+        return float(self.booster.predict(dmatrix)[0])
+
+
+def _load_handle(version, spec, region):
+    """
+    Builds a handle from a route spec:
+      endpoint:<endpoint-name>[#<variant-name>]  -> SageMaker endpoint (or one of its variants)
+      registry:<version-or-stage>                 -> booster from the MLflow model registry
+    """
+    kind, _, target = spec.partition(":")
+    if kind == "endpoint":
+        endpoint_name, _, variant = target.partition("#")
+        return EndpointHandle(version, endpoint_name, variant or None, region)
+    if kind == "registry":
+        return BoosterHandle(version, target)
+    raise ValueError(f"Unsupported model route spec '{spec}' for version '{version}'.")
+
+
+class ModelPool:
+    """
+    Memory-bounded LRU pool of model handles keyed by version.
+
+    Routes map a version or alias (e.g. "3", "production", "challenger") to a spec
+    understood by `_load_handle`. A numeric version with no route of its own is served
+    from the registry as `registry:<n>`, so every version train.py registers can be
+    requested without editing MODEL_ROUTES. Handles are loaded on first use, and the least
+    recently used ones are evicted once `max_bytes` or `max_models` is exceeded.
+    Versions listed in `preload` are loaded at startup so hot models never pay
+    the load cost on a live request.
+    """
+
+    def __init__(self, routes, default_version, traffic_split=None,
+                 max_bytes=512 * 1024 * 1024, max_models=8, region=None):
+        self.routes = dict(routes)
+        self.default_version = default_version
+        self.traffic_split = traffic_split or {}
+        self._validate_traffic_split()
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.region = region
+        self._handles = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+        # One lock per version so concurrent misses on the same version load it only once.
+        self._load_locks = {}
+
+    def _validate_traffic_split(self):
+        unknown = [v for v in self.traffic_split if v not in self.routes]
+        if unknown:
+            raise ValueError(f"MODEL_TRAFFIC_SPLIT names versions with no route: {', '.join(unknown)}")
+        for version, weight in self.traffic_split.items():
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+                raise ValueError(f"MODEL_TRAFFIC_SPLIT weight for '{version}' must be a positive number, got {weight!r}")
+
+    @classmethod
+    def from_env(cls, default_endpoint_name, region):
+        routes = json.loads(os.environ.get("MODEL_ROUTES", "{}"))
+        default_version = os.environ.get("MODEL_DEFAULT_VERSION", "production")
+        routes.setdefault(default_version, f"endpoint:{default_endpoint_name}")
+        return cls(
+            routes=routes,
+            default_version=default_version,
+            traffic_split=json.loads(os.environ.get("MODEL_TRAFFIC_SPLIT", "{}")),
+            max_bytes=int(os.environ.get("MODEL_POOL_MAX_BYTES", 512 * 1024 * 1024)),
+            max_models=int(os.environ.get("MODEL_POOL_MAX_MODELS", 8)),
+            region=region,
+        )
+
+    def route(self, version):
+        """Returns the spec for `version`, falling back to the registry for numeric versions."""
+        if version in self.routes:
+            return self.routes[version]
+        if version.isdigit():
+            return f"registry:{version}"
+        raise ModelNotFoundError(version)
+
+    def resolve(self, requested=None):
+        """Picks the version to serve: the one requested, else an A/B draw, else the default."""
+        if requested:
+            self.route(requested)
+            return requested
+        if self.traffic_split:
+            versions = list(self.traffic_split)
+            weights = [float(self.traffic_split[v]) for v in versions]
+            return random.choices(versions, weights=weights)[0]
+        return self.default_version
+
+    def _cached(self, version):
+        with self._lock:
+            handle = self._handles.get(version)
+            if handle is not None:
+                self._handles.move_to_end(version)
+                self._stats[version]["hits"] += 1
+            return handle
+
+    def get(self, version):
+        handle = self._cached(version)
+        if handle is not None:
+            return handle
+
+        spec = self.route(version)
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(version, threading.Lock())
+
+        # Load outside the pool lock so a slow registry download doesn't stall other versions;
+        # the per-version lock makes concurrent misses wait for the first load instead of repeating it.
+        with load_lock:
+            handle = self._cached(version)
+            if handle is not None:
+                return handle
+            start = time.perf_counter()
+            handle = _load_handle(version, spec, self.region)
+            load_seconds = time.perf_counter() - start
+            self._insert(version, handle, load_seconds)
+
+        publish_model_metrics(version, load_seconds, handle.memory_bytes, self.region)
+        print(f"Loaded model version '{version}' in {load_seconds:.3f}s ({handle.memory_bytes} bytes).")
+        return handle
+
+    def _insert(self, version, handle, load_seconds):
+        with self._lock:
+            stats = self._stats.setdefault(version, {"hits": 0, "loads": 0, "evictions": 0})
+            stats["loads"] += 1
+            stats["last_load_seconds"] = round(load_seconds, 4)
+            stats["memory_bytes"] = handle.memory_bytes
+            self._handles[version] = handle
+            self._handles.move_to_end(version)
+            self._evict()
+
+    def preload(self, versions):
+        for version in versions:
+            try:
+                self.get(version)
+            except Exception as e:
+                print(f"Could not preload model version '{version}': {e}")
+
+    def _evict(self):
+        while self._handles and (
+            len(self._handles) > self.max_models or self.memory_bytes() > self.max_bytes
+        ):
+            # Never evict the entry that was just inserted.
+            if len(self._handles) == 1:
+                break
+            version, _ = self._handles.popitem(last=False)
+            self._stats[version]["evictions"] += 1
+            self._stats[version]["memory_bytes"] = 0
+            print(f"Evicted model version '{version}' from the pool.")
+
+    def memory_bytes(self):
+        return sum(h.memory_bytes for h in self._handles.values())
+
+    def describe(self):
+        with self._lock:
+            return {
+                "default_version": self.default_version,
+                "traffic_split": self.traffic_split,
+                "routes": self.routes,
+                "loaded": list(self._handles),
+                "memory_bytes": self.memory_bytes(),
+                "max_bytes": self.max_bytes,
+                "versions": {v: dict(s) for v, s in self._stats.items()},
+            }
+
+
+def publish_model_metrics(version, load_seconds, memory_bytes, region):
+    """Publishes per-version load time and memory to CloudWatch when a namespace is configured."""
+    namespace = os.environ.get("MODEL_METRICS_NAMESPACE")
+    if not namespace:
+        return
+    dimensions = [{"Name": "ModelVersion", "Value": version}]
+    try:
+        boto3.client("cloudwatch", region_name=region).put_metric_data(
+            Namespace=namespace,
+            MetricData=[
+                {"MetricName": "ModelLoadTime", "Dimensions": dimensions,
+                 "Value": load_seconds, "Unit": "Seconds"},
+                {"MetricName": "ModelMemory", "Dimensions": dimensions,
+                 "Value": memory_bytes, "Unit": "Bytes"},
+            ],
+        )
+    except Exception as e:
+        print(f"Could not publish metrics for model version '{version}': {e}")
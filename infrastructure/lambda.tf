@@ -16,12 +16,33 @@ resource "aws_lambda_function" "trigger_deployment" {
     variables = {
       GITHUB_REPO              = var.github_repo
       GITHUB_TOKEN_SECRET_NAME = aws_secretsmanager_secret.github_pat.name
+      IDEMPOTENCY_TABLE        = aws_dynamodb_table.deployment_idempotency.name
     }
   }
 
   timeout = 30
 }
 
+# Records dispatched (ModelPackageArn, status) pairs so redelivered events don't
+# trigger duplicate deployment workflows. Items expire via DynamoDB TTL. The newest
+# dispatched version per model package group is kept under "latest#<group>" without
+# an expiry, so an approval delivered out of order never rolls production back.
+resource "aws_dynamodb_table" "deployment_idempotency" {
+  name         = "TriggerMLOpsDeploymentIdempotency"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "idempotency_key"
+
+  attribute {
+    name = "idempotency_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
 resource "aws_cloudwatch_event_rule" "sagemaker_approval_rule" {
   name        = "SageMakerModelApprovalRule"
   description = "Fires when a SageMaker Model Package approval state changes"
@@ -35,18 +56,50 @@ resource "aws_cloudwatch_event_rule" "sagemaker_approval_rule" {
   })
 }
 
-resource "aws_cloudwatch_event_target" "lambda_target" {
+# Approval events are buffered in SQS so a burst of approvals reaches the Lambda as one
+# batch, which it coalesces into a single deployment dispatch.
+resource "aws_sqs_queue" "model_approval_events_dlq" {
+  name = "ModelApprovalEventsDLQ"
+}
+
+resource "aws_sqs_queue" "model_approval_events" {
+  name                       = "ModelApprovalEvents"
+  visibility_timeout_seconds = 180 # at least 6x the Lambda timeout
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.model_approval_events_dlq.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_sqs_queue_policy" "allow_eventbridge" {
+  queue_url = aws_sqs_queue.model_approval_events.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect    = "Allow",
+      Principal = { Service = "events.amazonaws.com" },
+      Action    = "sqs:SendMessage",
+      Resource  = aws_sqs_queue.model_approval_events.arn,
+      Condition = {
+        ArnEquals = { "aws:SourceArn" = aws_cloudwatch_event_rule.sagemaker_approval_rule.arn }
+      }
+    }]
+  })
+}
+
+resource "aws_cloudwatch_event_target" "approval_queue_target" {
   rule      = aws_cloudwatch_event_rule.sagemaker_approval_rule.name
-  target_id = "TriggerDeploymentLambda"
-  arn       = aws_lambda_function.trigger_deployment.arn
+  target_id = "ModelApprovalEventsQueue"
+  arn       = aws_sqs_queue.model_approval_events.arn
 }
 
-resource "aws_lambda_permission" "allow_eventbridge" {
-  statement_id  = "AllowExecutionFromEventBridge"
-  action        = "lambda:InvokeFunction"
-  function_name = aws_lambda_function.trigger_deployment.function_name
-  principal     = "events.amazonaws.com"
-  source_arn    = aws_cloudwatch_event_rule.sagemaker_approval_rule.arn
+resource "aws_lambda_event_source_mapping" "approval_queue" {
+  event_source_arn                   = aws_sqs_queue.model_approval_events.arn
+  function_name                      = aws_lambda_function.trigger_deployment.arn
+  batch_size                         = 10
+  maximum_batching_window_in_seconds = 60
 }
 
 resource "random_id" "secret_suffix" {
@@ -1,81 +1,283 @@
+import base64
 import json
+import time
 import boto3
 import os
 import requests
+from requests.adapters import HTTPAdapter
 
 # Environment variables
 GITHUB_TOKEN_SECRET_NAME = os.environ.get("GITHUB_TOKEN_SECRET_NAME", "github-pat-for-mlops")
 GITHUB_REPO = os.environ.get("GITHUB_REPO") # e.g., "my-org/my-repo"
 REGION_NAME = os.environ.get("AWS_REGION", "us-east-1")
+SECRET_TTL_SECONDS = int(os.environ.get("SECRET_TTL_SECONDS", "300"))
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE") # DynamoDB table; in-memory store if unset
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+
+# Warm-container state. Lambda reuses the module between invocations, so clients,
+# the HTTP connection pool and the cached token survive until the container is recycled.
+_cold_start = True
+_secrets_client = None
+_http_session = None
+_token_cache = {"value": None, "expires_at": 0.0}
+
+
+def get_secrets_client():
+    global _secrets_client
+    if _secrets_client is None:
+        session = boto3.session.Session()
+        _secrets_client = session.client(service_name='secretsmanager', region_name=REGION_NAME)
+    return _secrets_client
+
+
+def get_http_session():
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        _http_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=2))
+    return _http_session
+
+
+def get_github_token(force_refresh=False):
+    """Retrieves the GitHub PAT from AWS Secrets Manager, cached for SECRET_TTL_SECONDS."""
+    now = time.time()
+    if not force_refresh and _token_cache["value"] and now < _token_cache["expires_at"]:
+        return _token_cache["value"]
 
-def get_github_token():
-    """Retrieves the GitHub PAT from AWS Secrets Manager."""
-    session = boto3.session.Session()
-    client = session.client(service_name='secretsmanager', region_name=REGION_NAME)
-    
     try:
-        get_secret_value_response = client.get_secret_value(
+        get_secret_value_response = get_secrets_client().get_secret_value(
             SecretId=GITHUB_TOKEN_SECRET_NAME
         )
     except Exception as e:
         print(f"Error retrieving secret: {e}")
         raise e
+
+    if 'SecretString' in get_secret_value_response:
+        secret = get_secret_value_response['SecretString']
+        token = json.loads(secret)['GITHUB_TOKEN']
     else:
-        if 'SecretString' in get_secret_value_response:
-            secret = get_secret_value_response['SecretString']
-            return json.loads(secret)['GITHUB_TOKEN']
-        else:
-            # Handle binary secret
-            decoded_binary_secret = base64.b64decode(get_secret_value_response['SecretBinary'])
-            return decoded_binary_secret.decode('utf-8')
+        # Handle binary secret
+        decoded_binary_secret = base64.b64decode(get_secret_value_response['SecretBinary'])
+        token = decoded_binary_secret.decode('utf-8')
 
+    _token_cache["value"] = token
+    _token_cache["expires_at"] = now + SECRET_TTL_SECONDS
+    return token
 
-def lambda_handler(event, context):
+
+class LocalIdempotencyStore:
+    """In-memory idempotency store. Dedupes within a warm container and stands in for DynamoDB in tests."""
+
+    def __init__(self):
+        self._items = {}
+        self._latest = {}
+
+    def claim(self, key, ttl_seconds):
+        """Returns True if `key` was not seen within its TTL, recording it as claimed."""
+        now = time.time()
+        expires_at = self._items.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+        self._items[key] = now + ttl_seconds
+        return True
+
+    def release(self, key):
+        self._items.pop(key, None)
+
+    def advance(self, group, version):
+        """
+        Records `version` as the newest dispatched for `group` if it is newer than the current one.
+        Returns the version it replaced (-1 if none), or None when `version` is not newer.
+        """
+        previous = self._latest.get(group, -1)
+        if version <= previous:
+            return None
+        self._latest[group] = version
+        return previous
+
+    def rollback(self, group, version, previous):
+        """Restores `previous` as the newest dispatched version, unless another dispatch moved it on."""
+        if self._latest.get(group) == version:
+            if previous < 0:
+                del self._latest[group]
+            else:
+                self._latest[group] = previous
+
+
+class DynamoDBIdempotencyStore:
+    """Idempotency store shared across containers, backed by a conditional put on a DynamoDB table."""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.client = boto3.client("dynamodb", region_name=REGION_NAME)
+
+    def claim(self, key, ttl_seconds):
+        now = int(time.time())
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={"idempotency_key": {"S": key}, "expires_at": {"N": str(now + ttl_seconds)}},
+                ConditionExpression="attribute_not_exists(idempotency_key) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+            return True
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def release(self, key):
+        self.client.delete_item(TableName=self.table_name, Key={"idempotency_key": {"S": key}})
+
+    # The newest dispatched version per group lives in the same table under "latest#<group>".
+    # It carries no expires_at, so the table's TTL never removes it.
+    def advance(self, group, version):
+        try:
+            response = self.client.put_item(
+                TableName=self.table_name,
+                Item={"idempotency_key": {"S": f"latest#{group}"}, "dispatched_version": {"N": str(version)}},
+                ConditionExpression="attribute_not_exists(idempotency_key) OR dispatched_version < :version",
+                ExpressionAttributeValues={":version": {"N": str(version)}},
+                ReturnValues="ALL_OLD",
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return None
+        previous = response.get("Attributes", {}).get("dispatched_version")
+        return int(previous["N"]) if previous else -1
+
+    def rollback(self, group, version, previous):
+        key = {"idempotency_key": {"S": f"latest#{group}"}}
+        condition = dict(
+            ConditionExpression="dispatched_version = :version",
+            ExpressionAttributeValues={":version": {"N": str(version)}},
+        )
+        try:
+            if previous < 0:
+                self.client.delete_item(TableName=self.table_name, Key=key, **condition)
+            else:
+                self.client.put_item(
+                    TableName=self.table_name,
+                    Item=dict(key, dispatched_version={"N": str(previous)}),
+                    **condition,
+                )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            pass
+
+
+idempotency_store = DynamoDBIdempotencyStore(IDEMPOTENCY_TABLE) if IDEMPOTENCY_TABLE else LocalIdempotencyStore()
+
+
+def extract_details(event):
     """
-    Lambda function triggered by EventBridge when a SageMaker Model Package state changes.
-    This function triggers a GitHub Actions workflow using repository_dispatch.
+    Flattens an invocation into a list of EventBridge `detail` dicts. Handles a single
+    EventBridge event, a list of events, and SQS batches whose bodies are EventBridge events.
     """
-    print("Received event: ", json.dumps(event))
+    if isinstance(event, list):
+        return [d for e in event for d in extract_details(e)]
+    if "Records" in event:
+        return [d for r in event["Records"] for d in extract_details(json.loads(r["body"]))]
+    return [event["detail"]]
 
-    model_package_arn = event['detail']['ModelPackageArn']
-    approval_status = event['detail']['ModelApprovalStatus']
 
-    if approval_status != "Approved":
-        print(f"Model package {model_package_arn} was not approved. Status is {approval_status}. Exiting.")
-        return {
-            'statusCode': 200,
-            'body': json.dumps('Model not approved. No action taken.')
-        }
+def _package_version(model_package_arn):
+    # arn:aws:sagemaker:<region>:<account>:model-package/<group>/<version>
+    tail = model_package_arn.rsplit("/", 1)[-1]
+    return int(tail) if tail.isdigit() else -1
 
-    print(f"Model {model_package_arn} was approved. Triggering deployment workflow.")
 
-    if not GITHUB_REPO:
-        raise ValueError("GITHUB_REPO environment variable is not set.")
+def _package_group(model_package_arn):
+    return model_package_arn.rsplit("/", 1)[0]
 
-    github_token = get_github_token()
-    
+
+def trigger_workflow(model_package_arn, coalesced_arns):
     url = f"https://api.github.com/repos/{GITHUB_REPO}/dispatches"
-    
+
     payload = {
         "event_type": "model-approved",
         "client_payload": {
-            "model_package_arn": model_package_arn
+            "model_package_arn": model_package_arn,
+            "coalesced_model_package_arns": coalesced_arns,
         }
     }
-    
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {github_token}"
-    }
-    
-    try:
-        response = requests.post(url, data=json.dumps(payload), headers=headers)
-        response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
-        print("Successfully triggered GitHub Actions workflow.")
-        return {
-            'statusCode': 200,
-            'body': json.dumps('Successfully triggered deployment workflow!')
+
+    for attempt in range(2):
+        headers = {
+            "Accept": "application/vnd.github.v3+json",
+            "Authorization": f"token {get_github_token(force_refresh=attempt > 0)}"
         }
-    except requests.exceptions.RequestException as e:
+        response = get_http_session().post(url, data=json.dumps(payload), headers=headers, timeout=10)
+        # A 401 with a cached token usually means the PAT was rotated; refresh once and retry.
+        if response.status_code != 401:
+            break
+    response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
+
+
+def lambda_handler(event, context):
+    """
+    Lambda function triggered when a SageMaker Model Package state changes. EventBridge
+    routes the events through an SQS queue, so each invocation receives a batch of them.
+    This function triggers a GitHub Actions workflow using repository_dispatch.
+
+    Duplicate deliveries of the same (ModelPackageArn, status) are dropped via the
+    idempotency store, and a burst of approvals is coalesced into a single dispatch
+    for the newest approved package. SQS does not preserve order across batches, so the
+    store also tracks the newest version dispatched per model package group; an approval
+    older than that is recorded but not dispatched, which would roll production back.
+    """
+    global _cold_start
+    start = time.perf_counter()
+    cold_start, _cold_start = _cold_start, False
+    print("Received event: ", json.dumps(event))
+
+    approved = []
+    for detail in extract_details(event):
+        model_package_arn = detail['ModelPackageArn']
+        approval_status = detail['ModelApprovalStatus']
+        if approval_status != "Approved":
+            print(f"Model package {model_package_arn} was not approved. Status is {approval_status}. Skipping.")
+            continue
+        key = f"{model_package_arn}#{approval_status}"
+        if not idempotency_store.claim(key, IDEMPOTENCY_TTL_SECONDS):
+            print(f"Model package {model_package_arn} was already dispatched. Skipping duplicate event.")
+            continue
+        approved.append((model_package_arn, key))
+
+    if not approved:
+        return _response('No new approved models. No action taken.', cold_start, start)
+
+    approved.sort(key=lambda item: _package_version(item[0]))
+    latest_arn = approved[-1][0]
+    coalesced_arns = [arn for arn, _ in approved]
+
+    group, version = _package_group(latest_arn), _package_version(latest_arn)
+    previous = idempotency_store.advance(group, version)
+    if previous is None:
+        print(f"Model {latest_arn} is not newer than the version already dispatched for {group}. "
+              f"Recording the approval without deploying it.")
+        return _response('Approval is older than the deployed model. No action taken.', cold_start, start)
+
+    print(f"Model {latest_arn} was approved. Triggering deployment workflow "
+          f"(coalesced {len(coalesced_arns)} approval(s)).")
+
+    try:
+        if not GITHUB_REPO:
+            raise ValueError("GITHUB_REPO environment variable is not set.")
+        trigger_workflow(latest_arn, coalesced_arns)
+    except Exception as e:
+        # Any failure, including fetching the token, must release the claims and the
+        # newest-version marker so the retried invocation dispatches again.
         print(f"Error triggering GitHub Actions workflow: {e}")
-        raise e 
\ No newline at end of file
+        idempotency_store.rollback(group, version, previous)
+        for _, key in approved:
+            idempotency_store.release(key)
+        raise
+
+    print("Successfully triggered GitHub Actions workflow.")
+    return _response('Successfully triggered deployment workflow!', cold_start, start)
+
+
+def _response(message, cold_start, start):
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    print(f"Invocation latency: {latency_ms} ms ({'cold' if cold_start else 'warm'} start)")
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'message': message, 'cold_start': cold_start, 'latency_ms': latency_ms})
+    }
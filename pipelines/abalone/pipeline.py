@@ -8,6 +8,7 @@ from sagemaker.workflow.properties import PropertyFile
 from sagemaker.model_metrics import ModelMetrics
 from sagemaker.workflow.step_collections import RegisterModel
 from sagemaker.workflow.parameters import ParameterString
+from sagemaker.workflow.execution_variables import ExecutionVariables
 import os
 
 def get_abalone_pipeline(
@@ -18,7 +19,8 @@ def get_abalone_pipeline(
     db_password,
     pipeline_name="AbaloneMLOpsPipeline",
     model_package_group_name="AbaloneModelPackageGroup",
-    base_job_prefix="abalone"
+    base_job_prefix="abalone",
+    features_s3_uri=None
 ):
     pipeline_session = PipelineSession()
     
@@ -40,6 +42,24 @@ def get_abalone_pipeline(
         name="DbPassword",
         default_value=db_password,
     )
+    # off | timers | cprofile | sample (see src/profiling.py)
+    profile_steps_param = ParameterString(
+        name="ProfileSteps",
+        default_value="off",
+    )
+
+    # Processing jobs only receive their entry script, so the shared profiling module is
+    # mounted separately and put on the path.
+    profiling_env = {
+        "PROFILE_STEPS": profile_steps_param,
+        "PIPELINE_EXECUTION_ID": ExecutionVariables.PIPELINE_EXECUTION_ID,
+        "MLFLOW_TRACKING_URI": mlflow_tracking_uri_param,
+        "PYTHONPATH": "/opt/ml/processing/input/profiling",
+    }
+    profiling_input = ProcessingInput(
+        source="src/profiling.py",
+        destination="/opt/ml/processing/input/profiling",
+    )
     
     # ========== PROCESSING STEP ==========
     
@@ -51,6 +71,7 @@ def get_abalone_pipeline(
         base_job_name=f"{base_job_prefix}/preprocess",
         sagemaker_session=pipeline_session,
         role=sagemaker_role,
+        env=profiling_env,
         entry_point="src/preprocess.py",
         dependencies=["pipelines/requirements.txt"],
         arguments=[
@@ -62,11 +83,15 @@ def get_abalone_pipeline(
     step_process = ProcessingStep(
         name="PreprocessAbaloneData",
         processor=script_preprocessor,
-        inputs=[],
+        # Materialized features (src/materialize_features.py) let preprocessing skip the transform.
+        inputs=[profiling_input] + ([
+            ProcessingInput(source=features_s3_uri, destination="/opt/ml/processing/features"),
+        ] if features_s3_uri else []),
         outputs=[
             ProcessingOutput(output_name="train", source="/opt/ml/processing/train"),
             ProcessingOutput(output_name="validation", source="/opt/ml/processing/validation"),
             ProcessingOutput(output_name="test", source="/opt/ml/processing/test"),
+            ProcessingOutput(output_name="profile", source="/opt/ml/processing/profile"),
         ],
     )
     
@@ -91,6 +116,10 @@ def get_abalone_pipeline(
         entry_point="train.py",
         source_dir="src",
         dependencies=["pipelines/requirements.txt"],
+        environment={
+            "PROFILE_STEPS": profile_steps_param,
+            "PIPELINE_EXECUTION_ID": ExecutionVariables.PIPELINE_EXECUTION_ID,
+        },
         hyperparameters={
             "objective": "reg:squarederror",
             "num_round": 100,
@@ -129,6 +158,7 @@ def get_abalone_pipeline(
         base_job_name=f"{base_job_prefix}/evaluate",
         sagemaker_session=pipeline_session,
         role=sagemaker_role,
+        env=profiling_env,
     )
 
     evaluation_report = PropertyFile(
@@ -149,6 +179,7 @@ def get_abalone_pipeline(
                 source=step_process.properties.ProcessingOutputConfig.Outputs["test"].S3Output.S3Uri,
                 destination="/opt/ml/processing/test",
             ),
+            profiling_input,
         ],
         outputs=[
             ProcessingOutput(output_name="evaluation", source="/opt/ml/processing/evaluation"),
@@ -188,6 +219,7 @@ def get_abalone_pipeline(
             mlflow_tracking_uri_param,
             db_endpoint_param,
             db_password_param,
+            profile_steps_param,
             processing_instance_count,
             processing_instance_type,
             training_instance_type,
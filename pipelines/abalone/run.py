@@ -13,7 +13,8 @@ def main():
     pipeline = get_abalone_pipeline(
         sagemaker_role=role, 
         s3_bucket=s3_bucket,
-        mlflow_tracking_uri=mlflow_tracking_uri
+        mlflow_tracking_uri=mlflow_tracking_uri,
+        features_s3_uri=os.environ.get("FEATURES_S3_URI")
     )
     
     print("Upserting pipeline definition...")
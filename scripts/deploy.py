@@ -1,112 +1,340 @@
 import argparse
-import boto3
+import asyncio
+import hashlib
+import random
 import time
 import os
 
-def deploy_staging(model_package_arn, sagemaker_role_arn, region):
-    sagemaker_client = boto3.client("sagemaker", region_name=region)
-    
-    model_name = f"abalone-staging-model-{int(time.time())}"
-    endpoint_config_name = f"abalone-staging-endpoint-config-{int(time.time())}"
-    endpoint_name = "abalone-staging"
-
-    print(f"Creating model: {model_name}")
-    sagemaker_client.create_model(
-        ModelName=model_name,
-        PrimaryContainer={
-            'ModelPackageName': model_package_arn
-        },
-        ExecutionRoleArn=sagemaker_role_arn
-    )
+import boto3
+from botocore.exceptions import ClientError
 
-    print(f"Creating endpoint configuration: {endpoint_config_name}")
-    sagemaker_client.create_endpoint_config(
-        EndpointConfigName=endpoint_config_name,
-        ProductionVariants=[
-            {
-                'VariantName': 'AllTraffic',
-                'ModelName': model_name,
-                'InitialInstanceCount': 1,
-                'InstanceType': 'ml.m5.large',
-                'InitialVariantWeight': 1.0
-            }
-        ]
-    )
+STAGING_ENDPOINT_NAME = "abalone-staging"
+PRODUCTION_STACK_NAME = "AbaloneProductionEndpoint"
+STAGING_INSTANCE_TYPE = "ml.m5.large"
+STAGING_INSTANCE_COUNT = 1
+
+# Polling schedule for the async waiters: start fast, back off to a ceiling.
+POLL_INITIAL_DELAY = 5
+POLL_MAX_DELAY = 60
+POLL_TIMEOUT = 60 * 60
+
+
+def boto3_client_factory(service, region):
+    return boto3.client(service, region_name=region)
+
+
+class PhaseTimer:
+    """Records wall-clock time per deployment phase for one target."""
+
+    def __init__(self, target):
+        self.target = target
+        self.timings = {}
+
+    def start(self, phase):
+        self.timings[phase] = -time.perf_counter()
+
+    def stop(self, phase):
+        self.timings[phase] += time.perf_counter()
+        print(f"[{self.target}] {phase}: {self.timings[phase]:.1f}s")
+
+
+async def wait_for(describe, is_done, is_failed, target, what, describe_failure=str,
+                   initial_delay=None, max_delay=None, timeout=None):
+    """
+    Polls `describe` without blocking the event loop until `is_done` or `is_failed`.
+    Delays grow exponentially with jitter so many concurrent targets don't poll in lockstep.
+    Unset delays and timeout fall back to the module-level POLL_* settings.
+    """
+    delay = POLL_INITIAL_DELAY if initial_delay is None else initial_delay
+    max_delay = POLL_MAX_DELAY if max_delay is None else max_delay
+    deadline = time.monotonic() + (POLL_TIMEOUT if timeout is None else timeout)
+    while True:
+        status = await asyncio.to_thread(describe)
+        if is_done(status):
+            return status
+        if is_failed(status):
+            raise RuntimeError(f"[{target}] {what} failed: {describe_failure(status)}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"[{target}] Timed out waiting for {what}, last status: {status}")
+        await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, max_delay)
+
+
+def _config_digest(model_package_arn, instance_type, instance_count):
+    key = f"{model_package_arn}|{instance_type}|{instance_count}"
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+
+def _is_not_found(error):
+    code = error.response.get("Error", {}).get("Code")
+    message = error.response.get("Error", {}).get("Message", "")
+    # SageMaker reports missing models/configs as ValidationException "Could not find ...".
+    return code in ("ResourceNotFound", "ValidationException") and "Could not find" in message
+
+
+async def deploy_staging(model_package_arn, sagemaker_role_arn, region, client_factory=boto3_client_factory):
+    """
+    Deploys a model package to the staging endpoint in `region` and waits for InService.
+
+    Model and endpoint config names are derived from the model package and instance
+    settings, so redeploying an unchanged package reuses both and skips the endpoint update.
+    """
+    target = f"staging/{region}"
+    sagemaker_client = client_factory("sagemaker", region)
+    timer = PhaseTimer(target)
+
+    digest = _config_digest(model_package_arn, STAGING_INSTANCE_TYPE, STAGING_INSTANCE_COUNT)
+    model_name = f"abalone-staging-model-{digest}"
+    endpoint_config_name = f"abalone-staging-endpoint-config-{digest}"
+    endpoint_name = STAGING_ENDPOINT_NAME
+
+    timer.start("model_create")
+    try:
+        await asyncio.to_thread(sagemaker_client.describe_model, ModelName=model_name)
+        print(f"[{target}] Reusing model: {model_name}")
+    except ClientError as e:
+        if not _is_not_found(e):
+            raise
+        print(f"[{target}] Creating model: {model_name}")
+        await asyncio.to_thread(
+            sagemaker_client.create_model,
+            ModelName=model_name,
+            PrimaryContainer={
+                'ModelPackageName': model_package_arn
+            },
+            ExecutionRoleArn=sagemaker_role_arn
+        )
+    timer.stop("model_create")
+
+    timer.start("config_create")
+    try:
+        await asyncio.to_thread(sagemaker_client.describe_endpoint_config, EndpointConfigName=endpoint_config_name)
+        print(f"[{target}] Reusing endpoint configuration: {endpoint_config_name}")
+    except ClientError as e:
+        if not _is_not_found(e):
+            raise
+        print(f"[{target}] Creating endpoint configuration: {endpoint_config_name}")
+        await asyncio.to_thread(
+            sagemaker_client.create_endpoint_config,
+            EndpointConfigName=endpoint_config_name,
+            ProductionVariants=[
+                {
+                    'VariantName': 'AllTraffic',
+                    'ModelName': model_name,
+                    'InitialInstanceCount': STAGING_INSTANCE_COUNT,
+                    'InstanceType': STAGING_INSTANCE_TYPE,
+                    'InitialVariantWeight': 1.0
+                }
+            ]
+        )
+    timer.stop("config_create")
 
-    print(f"Creating/Updating endpoint: {endpoint_name}")
+    timer.start("endpoint_in_service")
     try:
-        sagemaker_client.update_endpoint(
+        endpoint = await asyncio.to_thread(sagemaker_client.describe_endpoint, EndpointName=endpoint_name)
+    except ClientError as e:
+        if not _is_not_found(e):
+            raise
+        endpoint = None
+
+    if endpoint is None:
+        print(f"[{target}] Creating endpoint: {endpoint_name}")
+        await asyncio.to_thread(
+            sagemaker_client.create_endpoint,
             EndpointName=endpoint_name,
             EndpointConfigName=endpoint_config_name
         )
-    except sagemaker_client.exceptions.ResourceNotFoundException:
-        sagemaker_client.create_endpoint(
+    elif endpoint.get("EndpointConfigName") == endpoint_config_name and endpoint["EndpointStatus"] == "InService":
+        print(f"[{target}] Endpoint {endpoint_name} already serves {endpoint_config_name}. Nothing to update.")
+    elif _deploying_config(endpoint) == endpoint_config_name:
+        # An earlier deploy of the same config is still rolling out; SageMaker rejects a
+        # second update_endpoint while the endpoint is Updating, so just wait for it.
+        print(f"[{target}] Endpoint {endpoint_name} is already deploying {endpoint_config_name}. Waiting for it.")
+    else:
+        print(f"[{target}] Updating endpoint: {endpoint_name}")
+        await asyncio.to_thread(
+            sagemaker_client.update_endpoint,
             EndpointName=endpoint_name,
             EndpointConfigName=endpoint_config_name
         )
-    
-    print("Staging deployment initiated. It may take a few minutes for the endpoint to be in service.")
 
+    def describe():
+        endpoint = sagemaker_client.describe_endpoint(EndpointName=endpoint_name)
+        return {
+            "status": endpoint["EndpointStatus"],
+            "config": endpoint.get("EndpointConfigName"),
+            "failure_reason": endpoint.get("FailureReason"),
+        }
+
+    # A failed update rolls back to InService on the previous config, so the deploy only
+    # succeeded once the endpoint is InService on *our* config.
+    await wait_for(
+        describe,
+        is_done=lambda s: s["status"] == "InService" and s["config"] == endpoint_config_name,
+        is_failed=lambda s: s["status"] in ("Failed", "OutOfService", "RollingBack") or (
+            s["status"] == "InService" and s["config"] != endpoint_config_name),
+        target=target,
+        what=f"endpoint {endpoint_name}",
+        describe_failure=lambda s: (
+            f"status {s['status']} on config {s['config']}, "
+            f"FailureReason: {s['failure_reason'] or 'not reported'}"),
+    )
+    timer.stop("endpoint_in_service")
+    return timer.timings
+
+
+def _deploying_config(endpoint):
+    """Returns the config an endpoint is currently rolling out, or None when it is not updating."""
+    if endpoint["EndpointStatus"] not in ("Creating", "Updating", "SystemUpdating"):
+        return None
+    pending = endpoint.get("PendingDeploymentSummary", {}).get("EndpointConfigName")
+    return pending or endpoint.get("EndpointConfigName")
+
+
+def _stack_status(cf_client, stack_name):
+    """Returns the stack status, or None when the stack does not exist."""
+    try:
+        stacks = cf_client.describe_stacks(StackName=stack_name)["Stacks"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ValidationError":
+            return None
+        raise
+    return stacks[0]["StackStatus"]
 
-def deploy_production(model_package_arn, region):
-    cf_client = boto3.client("cloudformation", region_name=region)
-    stack_name = "AbaloneProductionEndpoint"
+
+async def deploy_production(model_package_arn, region, client_factory=boto3_client_factory):
+    target = f"production/{region}"
+    cf_client = client_factory("cloudformation", region)
+    stack_name = PRODUCTION_STACK_NAME
+    timer = PhaseTimer(target)
 
     with open("scripts/cfn/production-endpoint.yml", "r") as f:
         template_body = f.read()
 
-    print(f"Creating/Updating CloudFormation stack: {stack_name}")
-    
-    try:
-        cf_client.update_stack(
-            StackName=stack_name,
-            TemplateBody=template_body,
-            Parameters=[
-                {
-                    'ParameterKey': 'ModelPackageArn',
-                    'ParameterValue': model_package_arn
-                },
-            ],
-            Capabilities=['CAPABILITY_IAM']
-        )
-        waiter = cf_client.get_waiter('stack_update_complete')
-        waiter.wait(StackName=stack_name)
-    except cf_client.exceptions.ClientError as e:
-        if "No updates are to be performed" in str(e):
-             print("No updates to be performed on the stack.")
-        elif "does not exist" in str(e):
-            cf_client.create_stack(
-                StackName=stack_name,
-                TemplateBody=template_body,
-                Parameters=[
-                    {
-                        'ParameterKey': 'ModelPackageArn',
-                        'ParameterValue': model_package_arn
-                    },
-                ],
-                Capabilities=['CAPABILITY_IAM']
-            )
-            waiter = cf_client.get_waiter('stack_create_complete')
-            waiter.wait(StackName=stack_name)
-        else:
-            raise e
-            
-    print("Production deployment via CloudFormation completed.")
+    stack_args = dict(
+        StackName=stack_name,
+        TemplateBody=template_body,
+        Parameters=[
+            {
+                'ParameterKey': 'ModelPackageArn',
+                'ParameterValue': model_package_arn
+            },
+        ],
+        Capabilities=['CAPABILITY_IAM']
+    )
+
+    timer.start("stack_submit")
+    existing_status = await asyncio.to_thread(_stack_status, cf_client, stack_name)
+    if existing_status is None:
+        print(f"[{target}] Creating CloudFormation stack: {stack_name}")
+        await asyncio.to_thread(cf_client.create_stack, **stack_args)
+    else:
+        print(f"[{target}] Updating CloudFormation stack: {stack_name}")
+        try:
+            await asyncio.to_thread(cf_client.update_stack, **stack_args)
+        except ClientError as e:
+            # CloudFormation has no dedicated error code for a no-op update.
+            if "No updates are to be performed" not in e.response.get("Error", {}).get("Message", ""):
+                raise
+            print(f"[{target}] No updates to be performed on the stack.")
+            timer.stop("stack_submit")
+            return timer.timings
+    timer.stop("stack_submit")
+
+    timer.start("stack_complete")
+    await wait_for(
+        lambda: _stack_status(cf_client, stack_name),
+        is_done=lambda status: status in ("CREATE_COMPLETE", "UPDATE_COMPLETE"),
+        is_failed=lambda status: status is None or status.endswith("FAILED") or "ROLLBACK" in status,
+        target=target,
+        what=f"stack {stack_name}",
+    )
+    timer.stop("stack_complete")
+    return timer.timings
+
+
+def _arn_region(arn):
+    # arn:aws:sagemaker:<region>:<account>:model-package/<group>/<version>
+    parts = arn.split(":")
+    return parts[3] if len(parts) > 3 else None
+
+
+def package_arns_by_region(model_package_arns, regions):
+    """
+    Maps each region to the model package to deploy there. Model packages are regional, so
+    `model_package_arns` is an ARN, or an iterable of ARNs and `region=arn` pairs; a bare ARN
+    covers its own region. Raises ValueError if a region has no package or a package
+    belongs to a different region than the one it is deployed to.
+    """
+    if isinstance(model_package_arns, str):
+        model_package_arns = [model_package_arns]
+    by_region = {}
+    for value in model_package_arns:
+        region, sep, arn = value.partition("=")
+        if not sep:
+            region, arn = _arn_region(value), value
+        if _arn_region(arn) != region:
+            raise ValueError(f"Model package {arn} is not in region {region}.")
+        by_region[region] = arn
+    missing = [region for region in regions if region not in by_region]
+    if missing:
+        raise ValueError(
+            f"No model package for region(s) {', '.join(missing)}. Model packages are regional; "
+            f"pass one per region, e.g. --model-package-arn {missing[0]}=arn:aws:sagemaker:{missing[0]}:...")
+    return {region: by_region[region] for region in regions}
+
+
+async def deploy_all(model_package_arns, environments, regions, sagemaker_role_arn=None,
+                     client_factory=boto3_client_factory):
+    """
+    Rolls a model package out to every (environment, region) pair concurrently, using the
+    package for each region from `package_arns_by_region` (validated before any target starts).
+    Returns per-target phase timings, or the exception that target raised.
+    """
+    arns = package_arns_by_region(model_package_arns, regions)
+    targets = []
+    for environment in environments:
+        for region in regions:
+            if environment == "staging":
+                coro = deploy_staging(arns[region], sagemaker_role_arn, region, client_factory)
+            else:
+                coro = deploy_production(arns[region], region, client_factory)
+            targets.append((f"{environment}/{region}", coro))
+
+    results = await asyncio.gather(*(coro for _, coro in targets), return_exceptions=True)
+    return {name: result for (name, _), result in zip(targets, results)}
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--model-package-arn", type=str, required=True)
-    parser.add_argument("--environment", type=str, required=True, choices=["staging", "production"])
+    parser.add_argument("--model-package-arn", type=str, required=True, nargs="+",
+                        help="Model package ARN(s). Packages are regional: pass one per region, "
+                             "as a bare ARN or region=arn.")
+    parser.add_argument("--environment", type=str, required=True, nargs="+", choices=["staging", "production"])
+    parser.add_argument("--regions", type=str, nargs="+", default=[os.environ.get("AWS_REGION", "us-east-1")])
     args = parser.parse_args()
 
-    region = os.environ.get("AWS_REGION", "us-east-1")
+    role = os.environ["SAGEMAKER_ROLE_ARN"] if "staging" in args.environment else None
 
-    if args.environment == "staging":
-        role = os.environ["SAGEMAKER_ROLE_ARN"]
-        deploy_staging(args.model_package_arn, role, region)
-    elif args.environment == "production":
-        deploy_production(args.model_package_arn, region)
+    try:
+        package_arns_by_region(args.model_package_arn, args.regions)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    results = asyncio.run(deploy_all(args.model_package_arn, args.environment, args.regions, role))
+
+    print(f"\nDeployment summary ({time.perf_counter() - start:.1f}s total):")
+    failed = False
+    for target, result in results.items():
+        if isinstance(result, BaseException):
+            failed = True
+            print(f"  {target}: FAILED - {result}")
+        else:
+            phases = ", ".join(f"{phase}={seconds:.1f}s" for phase, seconds in result.items())
+            print(f"  {target}: OK ({phases})")
+    if failed:
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -4,24 +4,36 @@ import pandas as pd
 import numpy as np
 import joblib
 import xgboost as xgb
+from profiling import StepProfiler
 
 def main():
     model_path = "/opt/ml/processing/model/xgboost-model"
     test_path = "/opt/ml/processing/test/test.csv"
     output_dir = "/opt/ml/processing/evaluation"
-    
+
+    profiler = StepProfiler("evaluate", output_dir)
+    try:
+        evaluate(model_path, test_path, output_dir, profiler)
+    finally:
+        profiler.finish()
+
+
+def evaluate(model_path, test_path, output_dir, profiler):
     # Load the model
-    bst = joblib.load(model_path)
+    with profiler.phase("load"):
+        bst = joblib.load(model_path)
     
-    # Load the test data
-    test_df = pd.read_csv(test_path, header=None)
-    X_test = test_df.iloc[:, 1:]
-    y_test = test_df.iloc[:, 0]
+        # Load the test data
+        test_df = pd.read_csv(test_path, header=None)
+        X_test = test_df.iloc[:, 1:]
+        y_test = test_df.iloc[:, 0]
     
-    dtest = xgb.DMatrix(X_test)
+    with profiler.phase("dmatrix"):
+        dtest = xgb.DMatrix(X_test)
     
     # Make predictions
-    predictions = bst.predict(dtest)
+    with profiler.phase("predict"):
+        predictions = bst.predict(dtest)
     
     # Calculate RMSE
     rmse = np.sqrt(np.mean((y_test - predictions) ** 2))
@@ -0,0 +1,185 @@
+import cProfile
+import collections
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# PROFILE_STEPS selects what the pipeline steps record:
+#   off (default) - nothing
+#   timers        - per-phase wall/CPU time and peak RSS
+#   cprofile      - timers plus a cProfile dump of the whole step
+#   sample        - timers plus collapsed stacks from a sampling profiler (flamegraph input)
+PROFILE_MODES = ("off", "timers", "cprofile", "sample")
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StackSampler:
+    """Samples the main thread's stack on a background thread and counts collapsed stacks."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._thread_id = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class StepProfiler:
+    """
+    Opt-in profiler shared by preprocess.py, train.py and evaluate.py.
+
+    Wrap each phase in `with profiler.phase("load"):`, then call `finish()` once the step is
+    done to write `<step>-profile.json` (plus any cProfile/sampling dump) to `output_dir` and
+    log the timings as MLflow metrics. With PROFILE_STEPS unset or "off" every call is a no-op.
+    """
+
+    def __init__(self, step, output_dir, mode=None):
+        self.step = step
+        self.output_dir = output_dir
+        self.mode = (mode or os.environ.get("PROFILE_STEPS", "off")).lower()
+        if self.mode not in PROFILE_MODES:
+            print(f"Unknown PROFILE_STEPS value '{self.mode}', profiling disabled.")
+            self.mode = "off"
+        self.enabled = self.mode != "off"
+        # Set by the pipeline so every step's profile can be grouped by execution.
+        self.execution_id = os.environ.get("PIPELINE_EXECUTION_ID")
+        self.phases = {}
+        self.metrics = {}
+        self._profiler = None
+        self._sampler = None
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.mode == "sample":
+            self._sampler = StackSampler()
+            self._sampler.start()
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.phases[name] = {
+                "wall_s": time.perf_counter() - start_wall,
+                "cpu_s": time.process_time() - start_cpu,
+                "peak_rss_mb": _peak_rss_mb(),
+            }
+            print(f"[profile] {self.step}.{name}: wall {self.phases[name]['wall_s']:.3f}s, "
+                  f"cpu {self.phases[name]['cpu_s']:.3f}s, peak RSS {self.phases[name]['peak_rss_mb']:.1f} MB")
+
+    def record(self, name, value):
+        """Records an extra step-level metric, e.g. the mean boosting round time."""
+        if self.enabled:
+            self.metrics[name] = value
+
+    def summary(self):
+        return {
+            "step": self.step,
+            "mode": self.mode,
+            "pipeline_execution_id": self.execution_id,
+            "total_wall_s": time.perf_counter() - self._start_wall,
+            "total_cpu_s": time.process_time() - self._start_cpu,
+            "peak_rss_mb": _peak_rss_mb(),
+            "phases": self.phases,
+            "metrics": self.metrics,
+        }
+
+    def finish(self):
+        if not self.enabled:
+            return
+        summary = self.summary()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            prof_path = os.path.join(self.output_dir, f"{self.step}.prof")
+            self._profiler.dump_stats(prof_path)
+            with open(os.path.join(self.output_dir, f"{self.step}-cprofile.txt"), "w") as f:
+                pstats.Stats(self._profiler, stream=f).sort_stats("cumulative").print_stats(40)
+            print(f"[profile] cProfile dump written to {prof_path}")
+        if self._sampler is not None:
+            self._sampler.stop()
+            stacks_path = os.path.join(self.output_dir, f"{self.step}-stacks.txt")
+            self._sampler.dump(stacks_path)
+            print(f"[profile] Collapsed stacks written to {stacks_path}")
+
+        with open(os.path.join(self.output_dir, f"{self.step}-profile.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+
+        self._log_to_mlflow(summary)
+
+    def _log_to_mlflow(self, summary):
+        """
+        Logs timings to the active MLflow run, or to a new run when only MLFLOW_TRACKING_URI is set.
+        Either run is tagged with the step and pipeline execution id.
+        """
+        try:
+            import mlflow
+        except ImportError:
+            return
+
+        metrics = {
+            f"{self.step}_total_wall_s": summary["total_wall_s"],
+            f"{self.step}_total_cpu_s": summary["total_cpu_s"],
+            f"{self.step}_peak_rss_mb": summary["peak_rss_mb"],
+        }
+        for name, phase in self.phases.items():
+            metrics[f"{self.step}_{name}_wall_s"] = phase["wall_s"]
+            metrics[f"{self.step}_{name}_cpu_s"] = phase["cpu_s"]
+        for name, value in self.metrics.items():
+            metrics[f"{self.step}_{name}"] = value
+
+        tags = {"pipeline_step": self.step}
+        if self.execution_id:
+            tags["pipeline_execution_id"] = self.execution_id
+
+        try:
+            if mlflow.active_run() is not None:
+                mlflow.set_tags(tags)
+                mlflow.log_metrics(metrics)
+            elif os.environ.get("MLFLOW_TRACKING_URI"):
+                mlflow.set_experiment(os.environ.get("MLFLOW_EXPERIMENT_NAME", "abalone-age-prediction"))
+                with mlflow.start_run(run_name=f"{self.step}-profile", tags=tags):
+                    mlflow.log_metrics(metrics)
+        except Exception as e:
+            print(f"[profile] Could not log profile metrics to MLflow: {e}")
@@ -1,10 +1,29 @@
 import argparse
 import os
+import time
 import pandas as pd
 import xgboost as xgb
 import joblib
 import mlflow
 import mlflow.xgboost
+from profiling import StepProfiler
+
+
+class BoostRoundTimer(xgb.callback.TrainingCallback):
+    """Records the wall time of each boosting round."""
+
+    def __init__(self):
+        super().__init__()
+        self.round_seconds = []
+        self._start = None
+
+    def before_iteration(self, model, epoch, evals_log):
+        self._start = time.perf_counter()
+        return False
+
+    def after_iteration(self, model, epoch, evals_log):
+        self.round_seconds.append(time.perf_counter() - self._start)
+        return False
 
 def main():
     parser = argparse.ArgumentParser()
@@ -34,53 +53,74 @@ def main():
     mlflow.set_experiment(args.experiment_name)
 
     with mlflow.start_run():
-        # Load data
+        profiler = StepProfiler("train", args.output_data_dir)
+
+        try:
+            fit(args, profiler)
+        finally:
+            profiler.finish()
+
+
+def fit(args, profiler):
+    # Load data
+    with profiler.phase("load"):
         train_data = pd.read_csv(os.path.join(args.train, "train.csv"), header=None)
         val_data = pd.read_csv(os.path.join(args.validation, "validation.csv"), header=None)
 
-        # Separate labels and features
-        X_train, y_train = train_data.iloc[:, 1:], train_data.iloc[:, 0]
-        X_val, y_val = val_data.iloc[:, 1:], val_data.iloc[:, 0]
+    # Separate labels and features
+    X_train, y_train = train_data.iloc[:, 1:], train_data.iloc[:, 0]
+    X_val, y_val = val_data.iloc[:, 1:], val_data.iloc[:, 0]
 
+    with profiler.phase("dmatrix"):
         dtrain = xgb.DMatrix(X_train, label=y_train)
         dval = xgb.DMatrix(X_val, label=y_val)
 
-        # Log hyperparameters
-        params = {
-            "max_depth": args.max_depth,
-            "eta": args.eta,
-            "gamma": args.gamma,
-            "min_child_weight": args.min_child_weight,
-            "subsample": args.subsample,
-            "objective": args.objective,
-        }
-        mlflow.log_params(params)
-        
-        # Train the model and log metrics
-        evals_result = {}
-        bst = xgb.train(
-            params=params,
-            dtrain=dtrain,
-            evals=[(dval, "validation")],
-            num_boost_round=args.num_round,
-            early_stopping_rounds=10,
-            evals_result=evals_result
-        )
-
-        val_rmse = evals_result['validation']['rmse'][-1]
-        mlflow.log_metric("validation_rmse", val_rmse)
-
-        # Log the model using MLflow's XGBoost integration
-        mlflow.xgboost.log_model(
-            xgb_model=bst,
-            artifact_path="model",
-            registered_model_name="abalone-xgboost-model"
-        )
-        
-        # Also save the model in the format SageMaker expects
-        model_path = os.path.join(args.model_dir, "xgboost-model")
-        joblib.dump(bst, model_path)
-        print(f"Model saved to {model_path}")
+    # Log hyperparameters
+    params = {
+        "max_depth": args.max_depth,
+        "eta": args.eta,
+        "gamma": args.gamma,
+        "min_child_weight": args.min_child_weight,
+        "subsample": args.subsample,
+        "objective": args.objective,
+    }
+    mlflow.log_params(params)
+
+    # Train the model and log metrics
+    evals_result = {}
+    round_timer = BoostRoundTimer()
+    try:
+        with profiler.phase("boost"):
+            bst = xgb.train(
+                params=params,
+                dtrain=dtrain,
+                evals=[(dval, "validation")],
+                num_boost_round=args.num_round,
+                early_stopping_rounds=10,
+                evals_result=evals_result,
+                callbacks=[round_timer] if profiler.enabled else None
+            )
+    finally:
+        # Keep the rounds that completed even if boosting crashed part-way.
+        if round_timer.round_seconds:
+            profiler.record("boost_rounds", len(round_timer.round_seconds))
+            profiler.record("boost_round_mean_s", sum(round_timer.round_seconds) / len(round_timer.round_seconds))
+            profiler.record("boost_round_max_s", max(round_timer.round_seconds))
+
+    val_rmse = evals_result['validation']['rmse'][-1]
+    mlflow.log_metric("validation_rmse", val_rmse)
+
+    # Log the model using MLflow's XGBoost integration
+    mlflow.xgboost.log_model(
+        xgb_model=bst,
+        artifact_path="model",
+        registered_model_name="abalone-xgboost-model"
+    )
+
+    # Also save the model in the format SageMaker expects
+    model_path = os.path.join(args.model_dir, "xgboost-model")
+    joblib.dump(bst, model_path)
+    print(f"Model saved to {model_path}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,8 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The scripts under test are standalone entry points rather than an installed package.
+for path in ("api", "scripts", os.path.join("lambda", "trigger_deployment")):
+    sys.path.insert(0, os.path.join(REPO_ROOT, path))
@@ -0,0 +1,252 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+import deploy
+from conftest import REPO_ROOT
+
+ARN = "arn:aws:sagemaker:us-east-1:123456789012:model-package/AbaloneModelPackageGroup/3"
+EU_ARN = "arn:aws:sagemaker:eu-west-1:123456789012:model-package/AbaloneModelPackageGroup/5"
+
+
+def client_error(code, message):
+    return ClientError({"Error": {"Code": code, "Message": message}}, "Operation")
+
+
+class StubSageMaker:
+    """In-memory SageMaker control plane. Endpoints take `polls_to_settle` describes to settle."""
+
+    def __init__(self, polls_to_settle=2, fail_update=False):
+        self.polls_to_settle = polls_to_settle
+        self.fail_update = fail_update
+        self.models = set()
+        self.configs = set()
+        self.endpoint = None
+        self.calls = []
+
+    def describe_model(self, ModelName):
+        if ModelName not in self.models:
+            raise client_error("ValidationException", f"Could not find model \"{ModelName}\".")
+        return {"ModelName": ModelName}
+
+    def create_model(self, ModelName, **kwargs):
+        self.calls.append("create_model")
+        self.models.add(ModelName)
+
+    def describe_endpoint_config(self, EndpointConfigName):
+        if EndpointConfigName not in self.configs:
+            raise client_error("ValidationException", f"Could not find endpoint configuration \"{EndpointConfigName}\".")
+        return {"EndpointConfigName": EndpointConfigName}
+
+    def create_endpoint_config(self, EndpointConfigName, **kwargs):
+        self.calls.append("create_endpoint_config")
+        self.configs.add(EndpointConfigName)
+
+    def create_endpoint(self, EndpointName, EndpointConfigName):
+        self.calls.append("create_endpoint")
+        self.endpoint = {"EndpointStatus": "Creating", "EndpointConfigName": EndpointConfigName,
+                         "polls": 0, "target": EndpointConfigName}
+
+    def update_endpoint(self, EndpointName, EndpointConfigName):
+        self.calls.append("update_endpoint")
+        if self.endpoint["EndpointStatus"] != "InService":
+            raise client_error("ValidationException", "Cannot update in-progress endpoint")
+        self.endpoint.update(EndpointStatus="Updating", polls=0, target=EndpointConfigName)
+
+    def describe_endpoint(self, EndpointName):
+        if self.endpoint is None:
+            raise client_error("ValidationException", f"Could not find endpoint \"{EndpointName}\".")
+        ep = self.endpoint
+        if ep["EndpointStatus"] in ("Creating", "Updating"):
+            ep["polls"] += 1
+            if ep["polls"] >= self.polls_to_settle:
+                if ep["EndpointStatus"] == "Updating" and self.fail_update:
+                    ep.update(EndpointStatus="InService", FailureReason="Model container failed health check")
+                else:
+                    ep.update(EndpointStatus="InService", EndpointConfigName=ep["target"])
+        result = {k: v for k, v in ep.items() if k not in ("polls", "target")}
+        if ep["EndpointStatus"] == "Updating":
+            result["PendingDeploymentSummary"] = {"EndpointConfigName": ep["target"]}
+        return result
+
+
+class StubCloudFormation:
+    def __init__(self, final_status=None, polls_to_settle=2):
+        self.final_status = final_status
+        self.polls_to_settle = polls_to_settle
+        self.stack = None
+        self.parameters = None
+        self.calls = []
+
+    def describe_stacks(self, StackName):
+        if self.stack is None:
+            raise client_error("ValidationError", f"Stack with id {StackName} does not exist")
+        if self.stack["StackStatus"].endswith("IN_PROGRESS"):
+            self.stack["polls"] += 1
+            if self.stack["polls"] >= self.polls_to_settle:
+                self.stack["StackStatus"] = self.final_status or self.stack["StackStatus"].replace("IN_PROGRESS", "COMPLETE")
+        return {"Stacks": [{"StackName": StackName, "StackStatus": self.stack["StackStatus"]}]}
+
+    def create_stack(self, Parameters, **kwargs):
+        self.calls.append("create_stack")
+        self.parameters = Parameters
+        self.stack = {"StackStatus": "CREATE_IN_PROGRESS", "polls": 0}
+
+    def update_stack(self, Parameters, **kwargs):
+        self.calls.append("update_stack")
+        if Parameters == self.parameters:
+            raise client_error("ValidationError", "No updates are to be performed.")
+        self.parameters = Parameters
+        self.stack = {"StackStatus": "UPDATE_IN_PROGRESS", "polls": 0}
+
+
+class Factory:
+    """
+    client_factory handing out stubs. Keys are a service name or a (service, region) pair;
+    a stub class is instantiated once per region.
+    """
+
+    def __init__(self, stubs=None, **by_service):
+        self.stubs = dict(stubs or {}, **by_service)
+        self.clients = {}
+
+    def __call__(self, service, region):
+        if (service, region) not in self.clients:
+            stub = self.stubs.get((service, region), self.stubs.get(service))
+            self.clients[(service, region)] = stub() if isinstance(stub, type) else stub
+        return self.clients[(service, region)]
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(deploy, "POLL_INITIAL_DELAY", 0)
+    monkeypatch.setattr(deploy, "POLL_MAX_DELAY", 0)
+    # deploy_production reads the template relative to the repo root, as in CI.
+    monkeypatch.chdir(REPO_ROOT)
+
+
+def test_staging_fresh_create_waits_for_in_service():
+    sm = StubSageMaker()
+    timings = asyncio.run(deploy.deploy_staging(ARN, "role", "us-east-1", Factory(sagemaker=sm)))
+
+    assert sm.calls == ["create_model", "create_endpoint_config", "create_endpoint"]
+    assert sm.endpoint["EndpointStatus"] == "InService"
+    assert set(timings) == {"model_create", "config_create", "endpoint_in_service"}
+
+
+def test_staging_unchanged_redeploy_reuses_model_and_config():
+    sm = StubSageMaker()
+    factory = Factory(sagemaker=sm)
+    asyncio.run(deploy.deploy_staging(ARN, "role", "us-east-1", factory))
+    sm.calls.clear()
+
+    asyncio.run(deploy.deploy_staging(ARN, "role", "us-east-1", factory))
+
+    assert sm.calls == []
+
+
+def test_staging_new_package_updates_endpoint():
+    sm = StubSageMaker()
+    factory = Factory(sagemaker=sm)
+    asyncio.run(deploy.deploy_staging(ARN, "role", "us-east-1", factory))
+    sm.calls.clear()
+
+    asyncio.run(deploy.deploy_staging(ARN.replace("/3", "/4"), "role", "us-east-1", factory))
+
+    assert sm.calls == ["create_model", "create_endpoint_config", "update_endpoint"]
+
+
+def test_staging_waits_instead_of_updating_when_same_config_is_rolling_out():
+    sm = StubSageMaker(polls_to_settle=3)
+    factory = Factory(sagemaker=sm)
+    asyncio.run(deploy.deploy_staging(ARN, "role", "us-east-1", factory))
+    new_arn = ARN.replace("/3", "/4")
+    config = f"abalone-staging-endpoint-config-{deploy._config_digest(new_arn, 'ml.m5.large', 1)}"
+    sm.configs.add(config)
+    sm.update_endpoint("abalone-staging", config)
+    sm.calls.clear()
+
+    asyncio.run(deploy.deploy_staging(new_arn, "role", "us-east-1", factory))
+
+    assert "update_endpoint" not in sm.calls
+    assert sm.endpoint["EndpointConfigName"] == config
+
+
+def test_staging_update_rolled_back_to_old_config_fails():
+    sm = StubSageMaker()
+    factory = Factory(sagemaker=sm)
+    asyncio.run(deploy.deploy_staging(ARN, "role", "us-east-1", factory))
+    sm.fail_update = True
+
+    with pytest.raises(RuntimeError, match="Model container failed health check"):
+        asyncio.run(deploy.deploy_staging(ARN.replace("/3", "/4"), "role", "us-east-1", factory))
+
+
+def test_staging_endpoint_failed_raises():
+    sm = StubSageMaker()
+    factory = Factory(sagemaker=sm)
+    original_create = sm.create_endpoint
+
+    def create_failing(EndpointName, EndpointConfigName):
+        original_create(EndpointName, EndpointConfigName)
+        sm.endpoint.update(EndpointStatus="Failed", FailureReason="Insufficient capacity")
+
+    sm.create_endpoint = create_failing
+
+    with pytest.raises(RuntimeError, match="Insufficient capacity"):
+        asyncio.run(deploy.deploy_staging(ARN, "role", "us-east-1", factory))
+
+
+def test_production_creates_stack_when_missing():
+    cf = StubCloudFormation()
+    timings = asyncio.run(deploy.deploy_production(ARN, "us-east-1", Factory(cloudformation=cf)))
+
+    assert cf.calls == ["create_stack"]
+    assert cf.stack["StackStatus"] == "CREATE_COMPLETE"
+    assert set(timings) == {"stack_submit", "stack_complete"}
+
+
+def test_production_no_op_update_returns_without_waiting():
+    cf = StubCloudFormation()
+    factory = Factory(cloudformation=cf)
+    asyncio.run(deploy.deploy_production(ARN, "us-east-1", factory))
+
+    timings = asyncio.run(deploy.deploy_production(ARN, "us-east-1", factory))
+
+    assert cf.calls == ["create_stack", "update_stack"]
+    assert set(timings) == {"stack_submit"}
+
+
+def test_production_rollback_raises():
+    cf = StubCloudFormation(final_status="ROLLBACK_COMPLETE")
+
+    with pytest.raises(RuntimeError, match="ROLLBACK_COMPLETE"):
+        asyncio.run(deploy.deploy_production(ARN, "us-east-1", Factory(cloudformation=cf)))
+
+
+def test_deploy_all_reports_failures_per_target():
+    failing = StubCloudFormation(final_status="UPDATE_ROLLBACK_COMPLETE")
+    failing.stack = {"StackStatus": "CREATE_COMPLETE", "polls": 0}
+    factory = Factory({
+        "sagemaker": StubSageMaker,
+        ("cloudformation", "us-east-1"): StubCloudFormation(),
+        ("cloudformation", "eu-west-1"): failing,
+    })
+
+    results = asyncio.run(deploy.deploy_all(
+        [ARN, f"eu-west-1={EU_ARN}"], ["staging", "production"], ["us-east-1", "eu-west-1"], "role", factory))
+
+    assert isinstance(results["production/eu-west-1"], RuntimeError)
+    for target in ("staging/us-east-1", "staging/eu-west-1", "production/us-east-1"):
+        assert isinstance(results[target], dict), results[target]
+
+
+def test_deploy_all_rejects_package_from_another_region():
+    factory = Factory({"sagemaker": StubSageMaker, "cloudformation": StubCloudFormation})
+
+    with pytest.raises(ValueError, match="eu-west-1"):
+        asyncio.run(deploy.deploy_all(ARN, ["staging"], ["us-east-1", "eu-west-1"], "role", factory))
+    with pytest.raises(ValueError, match="not in region eu-west-1"):
+        asyncio.run(deploy.deploy_all([f"eu-west-1={ARN}"], ["staging"], ["eu-west-1"], "role", factory))
+    assert factory.clients == {}
@@ -0,0 +1,119 @@
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import model_pool
+from model_pool import ModelNotFoundError, ModelPool
+
+
+class StubHandle:
+    def __init__(self, version, spec, memory_bytes):
+        self.version = version
+        self.spec = spec
+        self.memory_bytes = memory_bytes
+
+    def predict(self, feature_vector):
+        return float(len(feature_vector))
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Replaces handle loading with stubs whose size is the number after '#' in the spec."""
+    calls = []
+
+    def load(version, spec, region):
+        calls.append((version, spec))
+        time.sleep(0.05)
+        return StubHandle(version, spec, int(spec.partition("#")[2] or 1))
+
+    monkeypatch.setattr(model_pool, "_load_handle", load)
+    monkeypatch.delenv("MODEL_METRICS_NAMESPACE", raising=False)
+    return calls
+
+
+def make_pool(**kwargs):
+    routes = {"production": "endpoint:prod#10", "challenger": "endpoint:chal#10", "3": "endpoint:v3#10"}
+    return ModelPool(routes, "production", **kwargs)
+
+
+def test_resolve_unknown_alias_raises():
+    with pytest.raises(ModelNotFoundError):
+        make_pool().resolve("staging")
+
+
+def test_unrouted_numeric_version_loads_from_registry(loads):
+    pool = make_pool()
+    assert pool.resolve("7") == "7"
+    pool.get("7")
+    assert loads == [("7", "registry:7")]
+
+
+def test_configured_route_wins_over_registry_fallback(loads):
+    make_pool().get("3")
+    assert loads == [("3", "endpoint:v3#10")]
+
+
+def test_evicts_least_recently_used_over_model_count(loads):
+    pool = make_pool(max_models=2)
+    pool.get("production")
+    pool.get("challenger")
+    pool.get("production")
+    pool.get("3")
+    assert pool.describe()["loaded"] == ["production", "3"]
+    assert pool.describe()["versions"]["challenger"]["evictions"] == 1
+
+
+def test_evicts_over_byte_budget_but_keeps_newest(loads):
+    pool = ModelPool({"a": "endpoint:a#60", "b": "endpoint:b#60", "big": "endpoint:big#500"}, "a", max_bytes=100)
+    pool.get("a")
+    pool.get("b")
+    assert pool.describe()["loaded"] == ["b"]
+    pool.get("big")
+    assert pool.describe()["loaded"] == ["big"]
+
+
+def test_concurrent_misses_load_once(loads):
+    pool = make_pool()
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(pool.get("challenger"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == [("challenger", "endpoint:chal#10")]
+    assert len({id(h) for h in handles}) == 1
+    assert pool.describe()["versions"]["challenger"]["hits"] == 4
+
+
+@pytest.mark.parametrize("split", [{"missing": 1}, {"production": 0}, {"production": True}, {"production": "1"}])
+def test_rejects_invalid_traffic_split(split):
+    with pytest.raises(ValueError):
+        make_pool(traffic_split=split)
+
+
+def test_booster_handle_predicts_with_trained_feature_names(monkeypatch, tmp_path):
+    np = pytest.importorskip("numpy")
+    pd = pytest.importorskip("pandas")
+    xgb = pytest.importorskip("xgboost")
+
+    # Mirror train.py: headerless CSV columns, so the booster stores feature names "1".."10".
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(rng.random((50, 11)))
+    booster = xgb.train({"max_depth": 2}, xgb.DMatrix(frame.iloc[:, 1:], label=frame.iloc[:, 0]), num_boost_round=3)
+    path = str(tmp_path / "model.json")
+    booster.save_model(path)
+    loaded = xgb.Booster(model_file=path)
+    assert loaded.feature_names == [str(i) for i in range(1, 11)]
+
+    mlflow = types.ModuleType("mlflow")
+    mlflow.xgboost = types.ModuleType("mlflow.xgboost")
+    mlflow.xgboost.load_model = lambda uri: loaded
+    monkeypatch.setitem(sys.modules, "mlflow", mlflow)
+    monkeypatch.setitem(sys.modules, "mlflow.xgboost", mlflow.xgboost)
+
+    handle = model_pool.BoosterHandle("7", "7")
+    assert handle.model_uri == "models:/abalone-xgboost-model/7"
+    assert isinstance(handle.predict([0.5] * 10), float)
@@ -0,0 +1,168 @@
+import json
+
+import pytest
+import requests
+
+import app
+
+GROUP_ARN = "arn:aws:sagemaker:us-east-1:123456789012:model-package/AbaloneModelPackageGroup"
+
+
+def approval_event(version, status="Approved"):
+    return {
+        "source": "aws.sagemaker",
+        "detail-type": "SageMaker Model Package State Change",
+        "detail": {"ModelPackageArn": f"{GROUP_ARN}/{version}", "ModelApprovalStatus": status},
+    }
+
+
+def sqs_batch(*events):
+    return {"Records": [{"body": json.dumps(event)} for event in events]}
+
+
+class StubSecretsManager:
+    def __init__(self, tokens=("token-1",), error=None):
+        self.tokens = list(tokens)
+        self.error = error
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        token = self.tokens[min(self.calls, len(self.tokens)) - 1]
+        return {"SecretString": json.dumps({"GITHUB_TOKEN": token})}
+
+
+class StubResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+
+class StubSession:
+    """Records dispatches and answers with the queued status codes (200 once they run out)."""
+
+    def __init__(self, status_codes=(), error=None):
+        self.status_codes = list(status_codes)
+        self.error = error
+        self.posts = []
+
+    def post(self, url, data, headers, timeout):
+        self.posts.append({"url": url, "payload": json.loads(data), "auth": headers["Authorization"]})
+        if self.error:
+            raise self.error
+        return StubResponse(self.status_codes.pop(0) if self.status_codes else 200)
+
+
+@pytest.fixture
+def secrets(monkeypatch):
+    stub = StubSecretsManager()
+    monkeypatch.setattr(app, "_secrets_client", stub)
+    return stub
+
+
+@pytest.fixture
+def session(monkeypatch):
+    stub = StubSession()
+    monkeypatch.setattr(app, "_http_session", stub)
+    return stub
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(app, "GITHUB_REPO", "my-org/my-repo")
+    monkeypatch.setattr(app, "idempotency_store", app.LocalIdempotencyStore())
+    monkeypatch.setattr(app, "_token_cache", {"value": None, "expires_at": 0.0})
+
+
+def test_duplicate_event_is_dropped(secrets, session):
+    app.lambda_handler(approval_event(3), None)
+    response = app.lambda_handler(approval_event(3), None)
+
+    assert len(session.posts) == 1
+    assert "No new approved models" in json.loads(response["body"])["message"]
+
+
+def test_burst_is_coalesced_into_one_dispatch_for_the_newest_version(secrets, session):
+    app.lambda_handler(sqs_batch(approval_event(3), approval_event(5), approval_event(4)), None)
+
+    assert len(session.posts) == 1
+    client_payload = session.posts[0]["payload"]["client_payload"]
+    assert client_payload["model_package_arn"] == f"{GROUP_ARN}/5"
+    assert sorted(client_payload["coalesced_model_package_arns"]) == [f"{GROUP_ARN}/{v}" for v in (3, 4, 5)]
+
+
+def test_older_approval_in_a_later_batch_is_not_dispatched(secrets, session):
+    app.lambda_handler(sqs_batch(approval_event(5)), None)
+    response = app.lambda_handler(sqs_batch(approval_event(4)), None)
+
+    assert [post["payload"]["client_payload"]["model_package_arn"] for post in session.posts] == [f"{GROUP_ARN}/5"]
+    assert "older than the deployed model" in json.loads(response["body"])["message"]
+
+    app.lambda_handler(sqs_batch(approval_event(6)), None)
+    assert session.posts[-1]["payload"]["client_payload"]["model_package_arn"] == f"{GROUP_ARN}/6"
+
+
+def test_failed_dispatch_does_not_block_older_versions(monkeypatch, secrets, session):
+    app.lambda_handler(approval_event(3), None)
+    monkeypatch.setattr(app, "_http_session", StubSession(error=requests.exceptions.ConnectionError("down")))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        app.lambda_handler(approval_event(5), None)
+
+    retry_session = StubSession()
+    monkeypatch.setattr(app, "_http_session", retry_session)
+    app.lambda_handler(approval_event(4), None)
+
+    assert len(retry_session.posts) == 1
+
+
+def test_unapproved_events_are_ignored(secrets, session):
+    app.lambda_handler(sqs_batch(approval_event(3, status="Rejected")), None)
+
+    assert session.posts == []
+
+
+def test_keys_are_released_when_dispatch_fails(monkeypatch, secrets):
+    monkeypatch.setattr(app, "_http_session", StubSession(error=requests.exceptions.ConnectionError("down")))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        app.lambda_handler(approval_event(3), None)
+
+    retry_session = StubSession()
+    monkeypatch.setattr(app, "_http_session", retry_session)
+    app.lambda_handler(approval_event(3), None)
+
+    assert len(retry_session.posts) == 1
+
+
+def test_keys_are_released_when_the_token_cannot_be_fetched(monkeypatch, session):
+    monkeypatch.setattr(app, "_secrets_client", StubSecretsManager(error=RuntimeError("AccessDenied")))
+    with pytest.raises(RuntimeError):
+        app.lambda_handler(approval_event(3), None)
+
+    monkeypatch.setattr(app, "_secrets_client", StubSecretsManager())
+    app.lambda_handler(approval_event(3), None)
+
+    assert len(session.posts) == 1
+
+
+def test_token_is_cached_across_warm_invocations(secrets, session):
+    app.lambda_handler(approval_event(3), None)
+    app.lambda_handler(approval_event(4), None)
+
+    assert secrets.calls == 1
+    assert len(session.posts) == 2
+
+
+def test_token_is_refreshed_once_on_401(monkeypatch, session):
+    secrets = StubSecretsManager(tokens=("stale-token", "rotated-token"))
+    monkeypatch.setattr(app, "_secrets_client", secrets)
+    session.status_codes = [401]
+
+    app.lambda_handler(approval_event(3), None)
+
+    assert secrets.calls == 2
+    assert [post["auth"] for post in session.posts] == ["token stale-token", "token rotated-token"]
@@ -1,52 +1,240 @@
 import streamlit as st
 import requests
 import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from requests.adapters import HTTPAdapter
 
 API_ENDPOINT = os.environ.get("API_ENDPOINT", "http://localhost:8000/predict") # Default for local testing
+REQUEST_TIMEOUT = float(os.environ.get("API_TIMEOUT_SECONDS", "10"))
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "8"))
+BULK_CHUNK_ROWS = int(os.environ.get("BULK_CHUNK_ROWS", "500"))
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "50000"))
+RESULTS_MAX_FILES = int(os.environ.get("BULK_RESULTS_MAX_FILES", "20"))
+RESULTS_TTL_SECONDS = int(os.environ.get("BULK_RESULTS_TTL_SECONDS", "3600"))
+
+FEATURE_FIELDS = ["sex", "length", "diameter", "height", "whole_weight",
+                  "shucked_weight", "viscera_weight", "shell_weight"]
+
+
+@st.cache_resource
+def get_session():
+    """One pooled HTTP session per server process, shared by every user and rerun."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BULK_WORKERS, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU of (pinned model version, payload) -> response, so duplicate records skip
+    the API. A cache lives for a single bulk run: a version may be a mutable alias that a
+    deployment moves to a new model, and cached answers are never written to prediction_logs.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def predict(payload, version=None, cache=None):
+    """
+    Returns (status_code, body, cached) for one record. Successful predictions for an explicit
+    version are stored in `cache` when one is given; cached answers are reported with status 200.
+    Without a version the API routes each request (possibly by A/B split), so every one must reach it.
+    """
+    if not version:
+        cache = None
+    key = (version, tuple(payload[field] for field in FEATURE_FIELDS))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return 200, cached, True
+
+    params = {"version": version} if version else None
+    response = get_session().post(API_ENDPOINT, json=payload, params=params, timeout=REQUEST_TIMEOUT)
+    body = response.json()
+    if cache is not None and response.status_code == 200 and isinstance(body, dict) and "predicted_age" in body:
+        cache.put(key, body)
+    return response.status_code, body, False
+
+
+@st.cache_resource
+def get_results_dir():
+    """Directory holding bulk results files for this server process."""
+    return tempfile.mkdtemp(prefix="abalone-bulk-results-")
+
+
+def prune_results(results_dir):
+    """Deletes results older than RESULTS_TTL_SECONDS and all but the newest RESULTS_MAX_FILES."""
+    paths = sorted(
+        (os.path.join(results_dir, name) for name in os.listdir(results_dir)),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    cutoff = time.time() - RESULTS_TTL_SECONDS
+    for index, path in enumerate(paths):
+        if index >= RESULTS_MAX_FILES or os.path.getmtime(path) < cutoff:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def predict_row(row, version, cache):
+    payload = {field: row[field] for field in FEATURE_FIELDS}
+    payload["sex"] = str(payload["sex"])
+    try:
+        status_code, body, cached = predict(payload, version, cache)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, None, False, str(e)
+    if status_code == 200 and isinstance(body, dict) and "predicted_age" in body:
+        return body["predicted_age"], body.get("model_version"), cached, None
+    return None, None, False, f"HTTP {status_code}: {body}"
+
 
 st.title("Abalone Age Prediction")
 
-st.markdown("""
-Enter the physical characteristics of an abalone to predict its age (number of rings).
-""")
-
-with st.form("prediction_form"):
-    sex = st.selectbox("Sex", options=["M", "F", "I"], help="M: Male, F: Female, I: Infant")
-    length = st.number_input("Length (mm)", value=0.455, format="%.3f")
-    diameter = st.number_input("Diameter (mm)", value=0.365, format="%.3f")
-    height = st.number_input("Height (mm)", value=0.095, format="%.3f")
-    whole_weight = st.number_input("Whole Weight (grams)", value=0.514, format="%.3f")
-    shucked_weight = st.number_input("Shucked Weight (grams)", value=0.2245, format="%.3f")
-    viscera_weight = st.number_input("Viscera Weight (grams)", value=0.101, format="%.3f")
-    shell_weight = st.number_input("Shell Weight (grams)", value=0.150, format="%.3f")
-
-    submitted = st.form_submit_button("Predict Age")
-
-    if submitted:
-        payload = {
-            "sex": sex,
-            "length": length,
-            "diameter": diameter,
-            "height": height,
-            "whole_weight": whole_weight,
-            "shucked_weight": shucked_weight,
-            "viscera_weight": viscera_weight,
-            "shell_weight": shell_weight,
-        }
-
-        try:
-            with st.spinner("Getting prediction..."):
-                response = requests.post(API_ENDPOINT, json=payload)
-            
-            if response.status_code == 200:
-                result = response.json()
-                st.success(f"Predicted Age (Rings): **{result['predicted_age']}**")
-            else:
-                st.error(f"Error: Could not get prediction. Status Code: {response.status_code}")
-                st.json(response.json())
-
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error connecting to the API: {e}")
+model_version = st.text_input(
+    "Model version (optional)",
+    help="A model version or alias such as 'production' or 'challenger'. Leave empty for the API's default routing.",
+).strip() or None
+
+single_tab, bulk_tab = st.tabs(["Single prediction", "Bulk upload"])
+
+with single_tab:
+    st.markdown("""
+    Enter the physical characteristics of an abalone to predict its age (number of rings).
+    """)
+
+    with st.form("prediction_form"):
+        sex = st.selectbox("Sex", options=["M", "F", "I"], help="M: Male, F: Female, I: Infant")
+        length = st.number_input("Length (mm)", value=0.455, format="%.3f")
+        diameter = st.number_input("Diameter (mm)", value=0.365, format="%.3f")
+        height = st.number_input("Height (mm)", value=0.095, format="%.3f")
+        whole_weight = st.number_input("Whole Weight (grams)", value=0.514, format="%.3f")
+        shucked_weight = st.number_input("Shucked Weight (grams)", value=0.2245, format="%.3f")
+        viscera_weight = st.number_input("Viscera Weight (grams)", value=0.101, format="%.3f")
+        shell_weight = st.number_input("Shell Weight (grams)", value=0.150, format="%.3f")
+
+        submitted = st.form_submit_button("Predict Age")
+
+        if submitted:
+            payload = {
+                "sex": sex,
+                "length": length,
+                "diameter": diameter,
+                "height": height,
+                "whole_weight": whole_weight,
+                "shucked_weight": shucked_weight,
+                "viscera_weight": viscera_weight,
+                "shell_weight": shell_weight,
+            }
+
+            try:
+                with st.spinner("Getting prediction..."):
+                    status_code, result, _ = predict(payload, model_version)
+
+                if status_code == 200:
+                    st.success(f"Predicted Age (Rings): **{result['predicted_age']}**")
+                else:
+                    st.error(f"Error: Could not get prediction. Status Code: {status_code}")
+                    st.json(result)
+
+            except requests.exceptions.RequestException as e:
+                st.error(f"Error connecting to the API: {e}")
+
+with bulk_tab:
+    st.markdown(f"""
+    Upload a CSV with the columns `{"`, `".join(FEATURE_FIELDS)}`. Rows are streamed to the API in
+    chunks of {BULK_CHUNK_ROWS} with {BULK_WORKERS} concurrent requests, and results are written to
+    disk as they arrive rather than held in the session.
+
+    When a model version is set, duplicate rows within one upload are sent to the API once and
+    the repeats reuse that answer. Reused rows are marked `cached` in the results and are **not**
+    written to the prediction log.
+    """)
+
+    uploaded = st.file_uploader("CSV file", type=["csv"])
+
+    if uploaded is not None and st.button("Predict All"):
+        header = pd.read_csv(uploaded, nrows=0)
+        missing = [field for field in FEATURE_FIELDS if field not in header.columns]
+        if missing:
+            st.error(f"Missing required column(s): {', '.join(missing)}")
+        else:
+            uploaded.seek(0)
+            previous_results = st.session_state.pop("bulk_results_path", None)
+            if previous_results and os.path.exists(previous_results):
+                os.remove(previous_results)
+            results_dir = get_results_dir()
+            # Other sessions' results are never deleted explicitly, so bound the directory here.
+            prune_results(results_dir)
+            results_file = tempfile.NamedTemporaryFile(
+                prefix="abalone-predictions-", suffix=".csv", dir=results_dir, delete=False)
+            results_file.close()
+
+            progress = st.progress(0.0)
+            status = st.empty()
+            total_bytes = max(uploaded.size, 1)
+            processed = failed = reused = 0
+            start = time.perf_counter()
+            # Scoped to this run so an alias moved to a new model is never answered from stale entries.
+            run_cache = PredictionCache(PREDICTION_CACHE_SIZE)
+
+            with ThreadPoolExecutor(max_workers=BULK_WORKERS) as pool:
+                for chunk_index, chunk in enumerate(pd.read_csv(uploaded, chunksize=BULK_CHUNK_ROWS)):
+                    rows = chunk[FEATURE_FIELDS].to_dict("records")
+                    outcomes = list(pool.map(lambda row: predict_row(row, model_version, run_cache), rows))
+                    chunk["predicted_age"], chunk["model_version"], chunk["cached"], chunk["error"] = zip(*outcomes)
+                    chunk.to_csv(results_file.name, mode="a", header=chunk_index == 0, index=False)
+
+                    processed += len(chunk)
+                    failed += int(chunk["error"].notna().sum())
+                    reused += int(chunk["cached"].sum())
+                    elapsed = time.perf_counter() - start
+                    progress.progress(min(uploaded.tell() / total_bytes, 1.0))
+                    status.markdown(f"Processed **{processed}** rows ({failed} failed, {reused} reused and not logged) at "
+                                    f"**{processed / elapsed:.1f} rows/s**")
+
+            progress.progress(1.0)
+            st.session_state["bulk_results_path"] = results_file.name
+            st.session_state["bulk_results_name"] = f"predictions-{uploaded.name}"
+
+    if "bulk_results_path" in st.session_state and not os.path.exists(st.session_state["bulk_results_path"]):
+        st.info("Previous bulk results have expired. Upload the file again to regenerate them.")
+        del st.session_state["bulk_results_path"]
+
+    if "bulk_results_path" in st.session_state:
+        with open(st.session_state["bulk_results_path"], "rb") as f:
+            st.download_button(
+                "Download results",
+                data=f,
+                file_name=st.session_state["bulk_results_name"],
+                mime="text/csv",
+            )
 
 st.markdown("---")
-st.markdown("This UI interacts with a FastAPI backend, which in turn invokes a deployed AWS SageMaker endpoint.") 
\ No newline at end of file
+st.markdown("This UI interacts with a FastAPI backend, which in turn invokes a deployed AWS SageMaker endpoint.")